@@ -25,11 +25,19 @@ __maintainer__ = __author__
 __email__ = 'libor.gabaj@gmail.com'
 
 # Standard library modules
-import time
 import os
 import sys
 import argparse
 import logging
+import logging.handlers
+import queue
+import signal
+import socket
+import threading
+try:
+    import pwd
+except ImportError:
+    pwd = None
 
 # Third party modules
 import gbj_pythonlib_sw.utils as modUtils
@@ -45,27 +53,64 @@ import gbj_pythonlib_iot.fan as iot_fan
 ###############################################################################
 # Enumeration and parameter classes
 ###############################################################################
-class Script:
-    """Script parameters."""
+class ScriptParams:
+    """Script parameters as slots of the single instance `Script`."""
+
+    __slots__ = (
+        'fullname', 'basename', 'name',
+        'service', 'lwt', 'mqtt_up', 'log_file',
+        'tick_cpu', 'tick_thread',
+        'fan_on', 'fan_temp_on', 'fan_temp_off', 'temp_file',
+        'stop_event',
+    )
+
+    def __init__(self):
+        (
+            self.fullname, self.basename, self.name,
+            self.service, self.lwt, self.mqtt_up, self.log_file,
+            self.tick_cpu, self.tick_thread,
+            self.fan_on, self.fan_temp_on, self.fan_temp_off, self.temp_file,
+        ) = (
+                None, None, None,
+                False, 'lwt', False, None,
+                None, None,
+                False, None, None, None,
+            )
+        self.stop_event = threading.Event()  # Set for finishing script loop
+
+
+class Fan:
+    """Fan parameters read from the configuration file."""
 
     (
-        fullname, basename, name,
-        running, service, lwt
+        pin_name, thermal_file,
+        percentage_on, percentage_off,
+        round_perc, round_temp,
     ) = (
-            None, None, None,
-            True, False, 'lwt',
+            None, '/sys/class/thermal/thermal_zone0/temp',
+            None, None,
+            1, 1,
         )
 
 
 ###############################################################################
 # Script global variables
 ###############################################################################
+STATUS_ACTIVE = iot.get_status(iot.Status.ACTIVE)  # Message of running fan
+STATUS_IDLE = iot.get_status(iot.Status.IDLE)  # Message of stopped fan
+STATUS_OFFLINE = iot.get_status(iot.Status.OFFLINE)  # Message of no script
+Script = ScriptParams()  # Object with script parameters
 cmdline = None  # Object with command line arguments
 logger = None  # Object with standard logging
+log_listener = None  # Object writing queued log records to the log file
 config = None  # Object with MQTT configuration file processing
 mqtt = None  # Object for MQTT broker manipulation
 pi = None  # Object with OrangePi GPIO control
 dev_fan = None  # Object for processing cooling fan parameters
+fan_commands = {}  # Mapping of fan commands to their actions
+fan_topics = {}  # Mapping of fan command topics to their actions
+published = {}  # Last messages published to MQTT topics
+topics = {}  # Cache of MQTT topic names resolved from configuration
 
 
 ###############################################################################
@@ -74,17 +119,38 @@ dev_fan = None  # Object for processing cooling fan parameters
 def action_exit():
     """Perform all activities right before exiting the script."""
     modTimer.stop_all()
-    mqtt_publish_lwt(iot.Status.OFFLINE)
+    mqtt_publish_lwt(STATUS_OFFLINE)
     mqtt.disconnect()
+    mqtt._client.loop_stop()
+    if Script.temp_file is not None:
+        Script.temp_file.close()
+
+
+def action_abort():
+    """Stop all running activities and exit the script at failed setup."""
+    modTimer.stop_all()
+    log_listener.stop()
+    sys.exit(1)
 
 
-def mqtt_message_log(message):
+def mqtt_message_payload(message):
+    """Decode MQTT message payload or return None if it is missing."""
+    if message.payload is None:
+        return None
+    return message.payload.decode('utf-8')
+
+
+def mqtt_message_log(message, caller, payload):
     """Log receiving from an MQTT topic.
 
     Arguments
     ---------
     message : MQTTMessage object
         This is an object with members `topic`, `payload`, `qos`, `retain`.
+    caller : str
+        Name of the callback function that received the message.
+    payload : str
+        Decoded message payload or None.
 
     Returns
     -------
@@ -97,45 +163,152 @@ def mqtt_message_log(message):
         Module for MQTT processing.
 
     """
-    if message.payload is None:
-        payload = "None"
-    else:
-        payload = message.payload.decode('utf-8')
     logger.debug(
         '%s -- MQTT topic %s, QoS=%s, retain=%s: %s',
-        sys._getframe(1).f_code.co_name,
+        caller,
         message.topic, message.qos, bool(message.retain), payload,
     )
-    return message.payload is not None
+    return payload is not None
 
 
-def fan_init():
-    """Set all fan parameters to initial values."""
-    dev_fan.reset()
+def clamp(value, value_min, value_max):
+    """Limit value to the provided range."""
+    if value < value_min:
+        return value_min
+    if value > value_max:
+        return value_max
+    return value
+
+
+def config_float(option, section, default=None):
+    """Read configuration option as a float number.
+
+    Returns
+    -------
+    float
+        Value of the option or the default one, if the option is missing or
+        it is not a number.
+
+    """
     try:
-        dev_fan.percentage_on = float(config.option(
-            'percentage_on', 'Fan', None))
-    except ValueError:
-        pass
+        return float(config.option(option, section, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def config_int(option, section, default=None):
+    """Read configuration option as an integer number.
+
+    Returns
+    -------
+    int
+        Value of the option or the default one, if the option is missing or
+        it is not an integer.
+
+    """
     try:
-        dev_fan.percentage_off = float(config.option(
-            'percentage_off', 'Fan', None))
-    except ValueError:
-        pass
+        return int(config.option(option, section, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def timer_schedule():
+    """Pin the timer thread to a CPU with batch scheduling once per thread."""
+    thread_id = threading.get_ident()
+    if thread_id == Script.tick_thread:
+        return
+    Script.tick_thread = thread_id
+    try:
+        if Script.tick_cpu is not None and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, {Script.tick_cpu})
+        if hasattr(os, 'SCHED_BATCH'):
+            os.sched_setscheduler(0, os.SCHED_BATCH, os.sched_param(0))
+    except OSError as errmsg:
+        logger.warning('Scheduling of timer thread failed: %s', errmsg)
+
+
+def config_fan():
+    """Read fan parameters from the configuration file."""
+    cfg_section = 'Fan'
+    Fan.pin_name = config.option('pin_name', cfg_section)
+    Fan.thermal_file = config.option(
+        'thermal_file', cfg_section, Fan.thermal_file)
+    Fan.percentage_on = config_float('percentage_on', cfg_section)
+    Fan.percentage_off = config_float('percentage_off', cfg_section)
     # Rounding
     round_def = 1
     round_min = 0
     round_max = 6
+    Fan.round_perc = clamp(
+        config_int('round_perc', cfg_section, round_def),
+        round_min, round_max)
+    Fan.round_temp = clamp(
+        config_int('round_temp', cfg_section, round_def),
+        round_min, round_max)
+
+
+def fan_init():
+    """Set all fan parameters to initial values."""
+    dev_fan.reset()
+    if Fan.percentage_on is not None:
+        dev_fan.percentage_on = Fan.percentage_on
+    if Fan.percentage_off is not None:
+        dev_fan.percentage_off = Fan.percentage_off
+    dev_fan.round_perc = Fan.round_perc
+    dev_fan.round_temp = Fan.round_temp
+    fan_limits()
+
+
+def fan_limits():
+    """Cache fan temperature limits converted from percentages."""
+    Script.fan_temp_on = dev_fan.temperature_on
+    Script.fan_temp_off = dev_fan.temperature_off
+
+
+def fan_switch(on):
+    """Switch the fan on or off and mirror its state.
+
+    Arguments
+    ---------
+    on : bool
+        Flag about switching the fan on.
+
+    """
+    fan_pin = dev_fan.pin
     try:
-        dev_fan.round_perc = int(config.option('round_perc', 'Fan', round_def))
-    except ValueError:
-        dev_fan.round_perc = round_def
-    dev_fan.round_perc = max(min(dev_fan.round_perc, round_max), round_min)
-    try:
-        dev_fan.round_temp = int(config.option('round_temp', 'Fan', round_def))
-    except ValueError:
-        dev_fan.round_temp = round_def
-    dev_fan.round_temp = max(min(dev_fan.round_temp, round_max), round_min)
+        if on:
+            pi.pin_on(fan_pin)
+        else:
+            pi.pin_off(fan_pin)
+        Script.fan_on = on
+    except OSError:
+        # Synchronize the mirrored state with the real state of the pin
+        Script.fan_on = pi.is_pin_on(fan_pin)
+        raise
+
+
+def fan_temperature():
+    """Read current SoC temperature from the open thermal file."""
+    if Script.temp_file is not None:
+        try:
+            Script.temp_file.seek(0)
+            temperature = float(Script.temp_file.read())
+            # Kernels report millidegrees or degrees Celsius
+            if temperature >= 1000.0:
+                temperature /= 1000.0
+            return temperature
+        except (OSError, ValueError) as errmsg:
+            logger.error('Reading thermal file failed: %s', errmsg)
+            Script.temp_file.close()
+            Script.temp_file = None
+    return dev_fan.temperature
+
+
+def fan_status():
+    """Determine fan status message for publishing."""
+    if Script.fan_on:
+        return STATUS_ACTIVE
+    return STATUS_IDLE
 
 
 def round_temp(value):
@@ -151,173 +324,382 @@ def round_perc(value):
 ###############################################################################
 # MQTT actions
 ###############################################################################
-def mqtt_publish_lwt(status):
-    """Publish script status to the MQTT LWT topic."""
-    if not mqtt.connected:
+def topic_name(cfg_option, cfg_section=None):
+    """Return MQTT topic name for configuration option from the cache.
+
+    Arguments
+    ---------
+    cfg_option : str
+        Configuration option with a topic definition.
+    cfg_section : str
+        Configuration section with the option. If not provided, the default
+        section of the MQTT broker object is used.
+
+    """
+    key = (cfg_option, cfg_section)
+    topic = topics.get(key)
+    if topic is None:
+        if cfg_section is None:
+            topic = mqtt.topic_name(cfg_option)
+        else:
+            topic = mqtt.topic_name(cfg_option, cfg_section)
+        topics[key] = topic
+    return topic
+
+
+def mqtt_set_nodelay(client):
+    """Disable Nagle's algorithm on the socket of the MQTT client.
+
+    Arguments
+    ---------
+    client : object
+        MQTT client instance with connection to the broker.
+
+    """
+    try:
+        sock = client.socket()
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except (AttributeError, OSError) as errmsg:
+        logger.warning('Setting TCP_NODELAY on MQTT socket failed: %s', errmsg)
+
+
+def mqtt_publish_changed(message, cfg_option, cfg_section):
+    """Publish message to MQTT topic only if it differs from the last one.
+
+    Arguments
+    ---------
+    message : str
+        Message to be published.
+    cfg_option : str
+        Configuration option with a topic definition.
+    cfg_section : str
+        Configuration section with the option.
+
+    Returns
+    -------
+    bool
+        Flag about publishing the message.
+
+    """
+    key = (cfg_option, cfg_section)
+    if published.get(key) == message:
+        return False
+    mqtt.publish(message, cfg_option, cfg_section)
+    published[key] = message
+    return True
+
+
+def mqtt_publish_lwt(message):
+    """Publish script status message to the MQTT LWT topic."""
+    if not Script.mqtt_up:
         return
     cfg_option = Script.lwt
     cfg_section = mqtt.GROUP_TOPICS
-    message = iot.get_status(status)
     try:
         mqtt.publish(message, cfg_option, cfg_section)
-        logger.debug(
-            'Published to LWT MQTT topic %s: %s',
-            mqtt.topic_name(cfg_option, cfg_section),
-            message
-        )
-    except Exception as errmsg:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                'Published to LWT MQTT topic %s: %s',
+                topic_name(cfg_option, cfg_section),
+                message
+            )
+    except (OSError, ValueError) as errmsg:
         logger.error(
             'Publishing %s to LWT MQTT topic %s failed: %s',
             message,
-            mqtt.topic_name(cfg_option, cfg_section),
+            topic_name(cfg_option, cfg_section),
             errmsg,
         )
 
 
-def mqtt_publish_fan_percon():
-    """Publish fan temperature percentage ON to the MQTT status topic."""
-    if not mqtt.connected:
-        return
-    cfg_option = 'fan_status_percon'
-    cfg_section = mqtt.GROUP_TOPICS
-    value = round_perc(dev_fan.percentage_on)
-    try:
-        mqtt.publish(str(value), cfg_option, cfg_section)
-        logger.debug(
-            'Published fan percentage ON=%s%% to MQTT topic %s',
-            value, mqtt.topic_name(cfg_option, cfg_section))
-    except Exception as errmsg:
-        logger.error(
-            'Publishing fan percentage ON=%s%% to MQTT topic %s failed: %s',
-            value, mqtt.topic_name(cfg_option, cfg_section), errmsg)
+def mqtt_message_fan_percon():
+    """Compose fan temperature percentage ON for the MQTT status topic."""
+    return (str(round_perc(dev_fan.percentage_on)),
+            'fan_status_percon', mqtt.GROUP_TOPICS,
+            'fan percentage ON={}%')
 
 
-def mqtt_publish_fan_percoff():
-    """Publish fan temperature percentage OFF to the MQTT status topic."""
-    if not mqtt.connected:
-        return
-    cfg_option = 'fan_status_percoff'
-    cfg_section = mqtt.GROUP_TOPICS
-    value = round_perc(dev_fan.percentage_off)
-    try:
-        mqtt.publish(str(value), cfg_option, cfg_section)
-        logger.debug(
-            'Published fan percentage OFF=%s%% to MQTT topic %s',
-            value, mqtt.topic_name(cfg_option, cfg_section))
-    except Exception as errmsg:
-        logger.error(
-            'Publishing fan percentage OFF=%s%% to MQTT topic %s failed: %s',
-            value, mqtt.topic_name(cfg_option, cfg_section), errmsg)
+def mqtt_message_fan_percoff():
+    """Compose fan temperature percentage OFF for the MQTT status topic."""
+    return (str(round_perc(dev_fan.percentage_off)),
+            'fan_status_percoff', mqtt.GROUP_TOPICS,
+            'fan percentage OFF={}%')
 
 
-def mqtt_publish_fan_tempon():
-    """Publish fan temperature value ON to the MQTT status topic."""
-    if not mqtt.connected:
-        return
-    cfg_option = 'fan_status_tempon'
-    cfg_section = mqtt.GROUP_TOPICS
-    value = round_temp(dev_fan.temperature_on)
-    try:
-        mqtt.publish(str(value), cfg_option, cfg_section)
-        logger.debug(
-            'Published fan temperature ON=%s°C to MQTT topic %s',
-            value, mqtt.topic_name(cfg_option, cfg_section))
-    except Exception as errmsg:
-        logger.error(
-            'Publishing fan temperature ON=%s°C to MQTT topic %s failed: %s',
-            value, mqtt.topic_name(cfg_option, cfg_section), errmsg)
+def mqtt_message_fan_tempon():
+    """Compose fan temperature value ON for the MQTT status topic."""
+    return (str(round_temp(dev_fan.temperature_on)),
+            'fan_status_tempon', mqtt.GROUP_TOPICS,
+            'fan temperature ON={}°C')
 
 
-def mqtt_publish_fan_tempoff():
-    """Publish fan temperature value OFF to the MQTT status topic."""
-    if not mqtt.connected:
-        return
-    cfg_option = 'fan_status_tempoff'
-    cfg_section = mqtt.GROUP_TOPICS
-    value = round_temp(dev_fan.temperature_off)
-    try:
-        mqtt.publish(str(value), cfg_option, cfg_section)
-        logger.debug(
-            'Published fan temperature OFF=%s°C to MQTT topic %s',
-            value, mqtt.topic_name(cfg_option, cfg_section))
-    except Exception as errmsg:
-        logger.error(
-            'Publishing fan temperature OFF=%s°C to MQTT topic %s failed: %s',
-            value, mqtt.topic_name(cfg_option, cfg_section), errmsg)
+def mqtt_message_fan_tempoff():
+    """Compose fan temperature value OFF for the MQTT status topic."""
+    return (str(round_temp(dev_fan.temperature_off)),
+            'fan_status_tempoff', mqtt.GROUP_TOPICS,
+            'fan temperature OFF={}°C')
+
+
+def mqtt_message_fan_status():
+    """Compose fan status for the MQTT status topic."""
+    return (fan_status(), 'mqtt_topic_fan_status', mqtt.GROUP_DEFAULT,
+            'fan status {}')
 
 
 def mqtt_publish_fan_status():
     """Publish fan status to the MQTT status topic."""
-    if not mqtt.connected:
+    mqtt_publish_batch([mqtt_message_fan_status()])
+
+
+def mqtt_publish_batch(items):
+    """Publish a batch of messages to MQTT topics in one pass.
+
+    Arguments
+    ---------
+    items : list of tuple
+        Tuples ``(message, cfg_option, cfg_section, label)`` to be published
+        in the listed order. The label is a format string describing
+        the message in log records.
+
+    """
+    if not Script.mqtt_up:
         return
-    cfg_option = 'mqtt_topic_fan_status'
-    cfg_section = mqtt.GROUP_DEFAULT
-    if pi.is_pin_on(dev_fan.pin):
-        message = iot.get_status(iot.Status.ACTIVE)
-    else:
-        message = iot.get_status(iot.Status.IDLE)
-    try:
-        mqtt.publish(message, cfg_option, cfg_section)
-        logger.debug(
-            'Published fan status %s to MQTT topic %s',
-            message, mqtt.topic_name(cfg_option, cfg_section),
-        )
-    except Exception as errmsg:
-        logger.error(
-            'Publishing fan status %s to MQTT topic %s failed: %s',
-            message,
-            mqtt.topic_name(cfg_option, cfg_section),
-            errmsg,
-        )
+    for message, cfg_option, cfg_section, label in items:
+        try:
+            if mqtt_publish_changed(message, cfg_option, cfg_section) \
+                    and logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    'Published %s to MQTT topic %s',
+                    label.format(message),
+                    topic_name(cfg_option, cfg_section))
+        except (OSError, ValueError) as errmsg:
+            logger.error(
+                'Publishing %s to MQTT topic %s failed: %s',
+                label.format(message),
+                topic_name(cfg_option, cfg_section),
+                errmsg)
 
 
 def mqtt_publish_fan_state():
     """Publish fan status and all parameters to the MQTT topics."""
+    mqtt_publish_batch([
+        mqtt_message_fan_status(),
+        mqtt_message_fan_percon(),
+        mqtt_message_fan_percoff(),
+        mqtt_message_fan_tempon(),
+        mqtt_message_fan_tempoff(),
+    ])
+
+
+###############################################################################
+# Fan command actions
+###############################################################################
+def fan_command_on():
+    """Turn on the fan if it is switched off."""
+    if not Script.fan_on:
+        try:
+            fan_switch(True)
+        except OSError as errmsg:
+            logger.error('Switching fan ON failed: %s', errmsg)
+            return
+        mqtt_publish_fan_status()
+
+
+def fan_command_off():
+    """Turn off the fan if it is switched on."""
+    if Script.fan_on:
+        try:
+            fan_switch(False)
+        except OSError as errmsg:
+            logger.error('Switching fan OFF failed: %s', errmsg)
+            return
+        mqtt_publish_fan_status()
+
+
+def fan_command_toggle():
+    """Toggle the fan."""
+    try:
+        fan_switch(not Script.fan_on)
+    except OSError as errmsg:
+        logger.error('Toggling fan failed: %s', errmsg)
+        return
     mqtt_publish_fan_status()
-    mqtt_publish_fan_percon()
-    mqtt_publish_fan_percoff()
-    mqtt_publish_fan_tempon()
-    mqtt_publish_fan_tempoff()
+
+
+def fan_command_status():
+    """Publish fan status and all its parameters."""
+    published.clear()
+    mqtt_publish_fan_state()
+
+
+def fan_command_reset():
+    """Reset fan parameters to initial values and publish them."""
+    published.clear()
+    fan_init()
+    mqtt_publish_fan_state()
+
+
+def payload_number(payload):
+    """Convert MQTT message payload to a number.
+
+    Returns
+    -------
+    float
+        Numeric value of the payload or None, if it is not a number.
+
+    """
+    try:
+        return float(payload)
+    except ValueError:
+        return None
+
+
+def fan_topic_command(payload):
+    """Execute fan command received from the fan command topic."""
+    action = fan_commands.get(iot.get_command_index(payload))
+    if action is not None:
+        action()
+
+
+def fan_topic_percon(payload):
+    """Update fan percentage ON received from the MQTT topic."""
+    value = payload_number(payload)
+    if value is None:
+        return
+    dev_fan.percentage_on = value
+    fan_limits()
+    mqtt_publish_batch([
+        mqtt_message_fan_percon(),
+        mqtt_message_fan_tempon(),
+    ])
+    logger.info('Updated fan percentage ON=%s%%', value)
+
+
+def fan_topic_percoff(payload):
+    """Update fan percentage OFF received from the MQTT topic."""
+    value = payload_number(payload)
+    if value is None:
+        return
+    dev_fan.percentage_off = value
+    fan_limits()
+    mqtt_publish_batch([
+        mqtt_message_fan_percoff(),
+        mqtt_message_fan_tempoff(),
+    ])
+    logger.info('Updated fan percentage OFF=%s%%', value)
+
+
+def fan_topic_tempon(payload):
+    """Update fan temperature ON received from the MQTT topic."""
+    value = payload_number(payload)
+    if value is None:
+        return
+    dev_fan.temperature_on = value
+    fan_limits()
+    mqtt_publish_batch([
+        mqtt_message_fan_tempon(),
+        mqtt_message_fan_percon(),
+    ])
+    logger.info('Updated fan temperature ON=%s°C', value)
+
+
+def fan_topic_tempoff(payload):
+    """Update fan temperature OFF received from the MQTT topic."""
+    value = payload_number(payload)
+    if value is None:
+        return
+    dev_fan.temperature_off = value
+    fan_limits()
+    mqtt_publish_batch([
+        mqtt_message_fan_tempoff(),
+        mqtt_message_fan_percoff(),
+    ])
+    logger.info('Updated fan temperature OFF=%s°C', value)
 
 
 ###############################################################################
 # Callback functions
 ###############################################################################
-def cbTimer_mqtt_reconnect(*arg, **kwargs):
-    """Execute MQTT reconnect."""
-    if mqtt.connected:
-        return
-    logger.warning('Reconnecting to MQTT broker')
+def cbTimer_tick(*arg, **kwargs):
+    """Execute all periodic actions at a timer tick."""
     try:
-        mqtt.reconnect()
-    except Exception as errmsg:
-        logger.error(
-            'Reconnection to MQTT broker failed with error: %s',
-            errmsg)
+        timer_schedule()
+        cbTimer_fan()
+    except Exception:
+        logger.exception('Timer tick failed with unexpected error')
 
 
-def cbTimer_fan(*arg, **kwargs):
+def cbTimer_fan(*arg, _script=Script, _temperature=fan_temperature,
+                _switch=fan_switch, _publish=mqtt_publish_fan_status,
+                **kwargs):
     """Check SoC temperature and control fan accordingly."""
-    fan_pin = dev_fan.pin
-    temp_cur = dev_fan.temperature
-    temp_on = dev_fan.temperature_on
-    temp_off = dev_fan.temperature_off
-    msg = \
-        f'Current SoC temperature ' \
-        f'{round_temp(temp_cur)}°C'
-    logger.debug(msg)
+    # Underscored arguments bind per-tick objects locally, callers omit them
+    temp_cur = _temperature()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Current SoC temperature %s°C', round_temp(temp_cur))
     # Turn on fan at reaching start temperature and fan is switched off
-    if temp_cur >= temp_on and pi.is_pin_off(fan_pin):
-        pi.pin_on(fan_pin)
-        mqtt_publish_fan_status()
+    if temp_cur >= _script.fan_temp_on and not _script.fan_on:
+        try:
+            _switch(True)
+        except OSError as errmsg:
+            logger.error('Switching fan ON failed: %s', errmsg)
+            return
+        _publish()
         logger.info('Fan switched ON')
     # Turn off fan at reaching stop temperature and fan is switched on
-    if temp_cur <= temp_off and pi.is_pin_on(fan_pin):
-        pi.pin_off(fan_pin)
-        mqtt_publish_fan_status()
+    if temp_cur <= _script.fan_temp_off and _script.fan_on:
+        try:
+            _switch(False)
+        except OSError as errmsg:
+            logger.error('Switching fan OFF failed: %s', errmsg)
+            return
+        _publish()
         logger.info('Fan switched OFF')
 
 
+def cbSignal_stop(signum, frame):
+    """Finish the script loop at receiving a terminating signal.
+
+    Arguments
+    ---------
+    signum : int
+        Number of the received signal.
+    frame : frame object
+        Current stack frame.
+
+    """
+    logger.warning(
+        'Script cancelled by signal %s', signal.Signals(signum).name)
+    Script.stop_event.set()
+
+
+def cbSignal_reload(signum, frame):
+    """Reload configuration file and reinitialize fan parameters.
+
+    Arguments
+    ---------
+    signum : int
+        Number of the received signal.
+    frame : frame object
+        Current stack frame.
+
+    """
+    logger.warning('Reloading configuration file %s', cmdline.config)
+    pin_name, thermal_file = Fan.pin_name, Fan.thermal_file
+    try:
+        setup_config()
+    except Exception as errmsg:
+        logger.error('Reloading configuration file failed: %s', errmsg)
+        return
+    # Fan pin and thermal file are in use since the start of the script
+    if (Fan.pin_name, Fan.thermal_file) != (pin_name, thermal_file):
+        logger.warning('Fan pin and thermal file change after restart only')
+        Fan.pin_name, Fan.thermal_file = pin_name, thermal_file
+    logger.info('MQTT, timer, and privilege options change after restart only')
+    fan_init()
+    mqtt_publish_fan_state()
+
+
 def cbMqtt_on_connect(client, userdata, flags, rc):
     """Process actions when the broker responds to a connection request.
 
@@ -339,9 +721,16 @@ def cbMqtt_on_connect(client, userdata, flags, rc):
 
     """
     if rc == 0:
-        logger.debug('Connected to %s: %s', str(mqtt), userdata)
-        setup_mqtt_filters()
-        mqtt_publish_fan_state()
+        Script.mqtt_up = True
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Connected to %s: %s', str(mqtt), userdata)
+        try:
+            mqtt_set_nodelay(client)
+            setup_mqtt_filters()
+            published.clear()
+            mqtt_publish_fan_state()
+        except Exception:
+            logger.exception('MQTT connection setup failed unexpectedly')
     else:
         logger.error('Connection to MQTT broker failed: %s (rc = %d)',
                      userdata, rc)
@@ -365,6 +754,7 @@ def cbMqtt_on_disconnect(client, userdata, rc):
         Description of callback arguments for proper utilizing.
 
     """
+    Script.mqtt_up = False
     logger.warning('Disconnected from %s: %s (rc = %d)',
                    str(mqtt), userdata, rc)
 
@@ -410,8 +800,9 @@ def cbMqtt_on_message(client, userdata, message):
       topic filter matched.
 
     """
-    if not mqtt_message_log(message):
-        return
+    if logger.isEnabledFor(logging.DEBUG):
+        mqtt_message_log(
+            message, 'cbMqtt_on_message', mqtt_message_payload(message))
 
 
 def cbMqtt_dev_fan(client, userdata, message):
@@ -432,64 +823,21 @@ def cbMqtt_dev_fan(client, userdata, message):
       filter for server commands.
 
     """
-    if not mqtt_message_log(message):
-        return
-    command = iot.get_command_index(message.payload.decode('utf-8'))
     try:
-        value = float(message.payload)
-    except ValueError:
-        value = None
-    if message.topic == mqtt.topic_name('mqtt_topic_fan_command',
-                                        mqtt.GROUP_DEFAULT):
-        fan_pin = dev_fan.pin
-        if command == iot.Command.ON and pi.is_pin_off(fan_pin):
-            pi.pin_on(fan_pin)
-            mqtt_publish_fan_status()
-        elif command == iot.Command.OFF and pi.is_pin_on(fan_pin):
-            pi.pin_off(fan_pin)
-            mqtt_publish_fan_status()
-        elif command == iot.Command.TOGGLE:
-            if pi.is_pin_on(fan_pin):
-                pi.pin_off(fan_pin)
-            else:
-                pi.pin_on(fan_pin)
-            mqtt_publish_fan_status()
-        elif command == iot.Command.STATUS:
-            mqtt_publish_fan_state()
-        elif command == iot.Command.RESET:
-            fan_init()
-            mqtt_publish_fan_state()
-    elif message.topic == mqtt.topic_name('fan_command_percon'):
-        if value is not None:
-            dev_fan.percentage_on = value
-            mqtt_publish_fan_percon()
-            mqtt_publish_fan_tempon()
-            logger.info('Updated fan percentage ON=%s%%', value)
-    elif message.topic == mqtt.topic_name('fan_command_percoff'):
-        if value is not None:
-            dev_fan.percentage_off = value
-            mqtt_publish_fan_percoff()
-            mqtt_publish_fan_tempoff()
-            logger.info('Updated fan percentage OFF=%s%%', value)
-    elif message.topic == mqtt.topic_name('fan_command_tempon'):
-        if value is not None:
-            dev_fan.temperature_on = value
-            mqtt_publish_fan_tempon()
-            mqtt_publish_fan_percon()
-            logger.info('Updated fan temperature ON=%s°C', value)
-    elif message.topic == mqtt.topic_name('fan_command_tempoff'):
-        if value is not None:
-            dev_fan.temperature_off = value
-            mqtt_publish_fan_tempoff()
-            mqtt_publish_fan_percoff()
-            logger.info('Updated fan temperature OFF=%s°C', value)
-    # Unexpected command
-    else:
-        logger.debug(
-            'Unexpected topic "%s" with value: "%s"',
-            message.topic,
-            message.payload
-        )
+        payload = mqtt_message_payload(message)
+        if not mqtt_message_log(message, 'cbMqtt_dev_fan', payload):
+            return
+        action = fan_topics.get(message.topic)
+        if action is None:
+            logger.debug(
+                'Unexpected topic "%s" with value: "%s"',
+                message.topic,
+                payload
+            )
+            return
+        action(payload)
+    except Exception:
+        logger.exception('MQTT command failed with unexpected error')
 
 
 ###############################################################################
@@ -520,7 +868,7 @@ def setup_cmdline():
     # Position arguments
     parser.add_argument(
         'config',
-        type=argparse.FileType('r'),
+        type=str,
         nargs='?',
         default=config_file,
         help='Configuration INI file, default: ' + config_file
@@ -561,15 +909,22 @@ def setup_cmdline():
 
 def setup_logger():
     """Configure logging facility."""
-    global logger
-    # Set logging to file for module and script logging
-    log_file = '/'.join([cmdline.logdir, Script.basename + '.log'])
+    global logger, log_listener
+    # Set logging to file for module and script logging through a queue
+    Script.log_file = os.path.join(cmdline.logdir, Script.basename + '.log')
+    file_handler = logging.FileHandler(Script.log_file, mode='w')
+    file_handler.setFormatter(logging.Formatter(
+        '%(asctime)s - %(levelname)-8s - %(name)s: %(message)s'))
+    log_queue = queue.Queue(-1)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # Pass plain message to the file handler for formatting
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
     logging.basicConfig(
         level=getattr(logging, cmdline.loglevel.upper()),
-        format='%(asctime)s - %(levelname)-8s - %(name)s: %(message)s',
-        filename=log_file,
-        filemode='w'
+        handlers=[queue_handler],
     )
+    log_listener = logging.handlers.QueueListener(log_queue, file_handler)
+    log_listener.start()
     # Set console logging
     formatter = logging.Formatter(
         '%(levelname)-8s - %(name)-20s: %(message)s')
@@ -578,14 +933,18 @@ def setup_logger():
     console_handler.setFormatter(formatter)
     logger = logging.getLogger('{} {}'.format(
         os.path.basename(__file__), __version__))
-    logger.addHandler(console_handler)
+    # Service output is already captured by the system journal
+    if not Script.service:
+        logger.addHandler(console_handler)
     logger.warning('Script started from file %s', os.path.abspath(__file__))
 
 
 def setup_config():
     """Define configuration file management."""
     global config
-    config = modConfig.Config(cmdline.config)
+    with open(cmdline.config) as config_file:
+        config = modConfig.Config(config_file)
+    config_fan()
 
 
 def setup_pi():
@@ -594,11 +953,39 @@ def setup_pi():
     pi = modOrangePi.OrangePiOne()
 
 
+def setup_privileges():
+    """Drop root privileges after all privileged resources are acquired."""
+    user = config.option('user', 'Privileges', None)
+    if not user or pwd is None or not modUtils.root():
+        return
+    try:
+        account = pwd.getpwnam(user)
+    except KeyError:
+        raise OSError('Unknown user {}'.format(user))
+    os.setgroups([])
+    os.setgid(account.pw_gid)
+    os.setuid(account.pw_uid)
+    # Fail if the fan cannot be switched without root
+    fan_switch(Script.fan_on)
+    logger.info('Script runs under user %s', user)
+
+
 def setup_fan():
     """Define cooling fan parameters."""
     global dev_fan
-    dev_fan = iot_fan.Fan(config.option('pin_name', 'Fan'))
+    dev_fan = iot_fan.Fan(Fan.pin_name)
     fan_init()
+    try:
+        Script.temp_file = open(Fan.thermal_file, 'rb')
+    except OSError as errmsg:
+        logger.warning('Opening thermal file failed: %s', errmsg)
+    fan_commands.update({
+        iot.Command.ON: fan_command_on,
+        iot.Command.OFF: fan_command_off,
+        iot.Command.TOGGLE: fan_command_toggle,
+        iot.Command.STATUS: fan_command_status,
+        iot.Command.RESET: fan_command_reset,
+    })
 
 
 def setup_mqtt():
@@ -611,18 +998,50 @@ def setup_mqtt():
         subscribe=cbMqtt_on_subscribe,
         message=cbMqtt_on_message,
     )
+    setup_mqtt_topics()
     # Last will and testament
-    status = iot.get_status(iot.Status.OFFLINE)
-    mqtt.lwt(status, Script.lwt, mqtt.GROUP_TOPICS)
+    mqtt.lwt(STATUS_OFFLINE, Script.lwt, mqtt.GROUP_TOPICS)
+    # Reconnection with backoff in the network thread of the client
+    mqtt._client.reconnect_delay_set(min_delay=1, max_delay=120)
     try:
         mqtt.connect(
             username=config.option('username', mqtt.GROUP_BROKER),
             password=config.option('password', mqtt.GROUP_BROKER),
         )
-    except Exception as errmsg:
+    except (OSError, ValueError) as errmsg:
         logger.error(
             'Connection to MQTT broker failed with error: %s',
             errmsg)
+    # Keep the network loop running for retrying a failed connection
+    mqtt._client.loop_start()
+
+
+def setup_mqtt_topics():
+    """Resolve all utilized MQTT topic names and map command topics."""
+    topics.clear()
+    for cfg_option, cfg_section in [
+        (Script.lwt, mqtt.GROUP_TOPICS),
+        ('mqtt_topic_fan_status', mqtt.GROUP_DEFAULT),
+        ('mqtt_topic_fan_command', mqtt.GROUP_DEFAULT),
+        ('fan_status_percon', mqtt.GROUP_TOPICS),
+        ('fan_status_percoff', mqtt.GROUP_TOPICS),
+        ('fan_status_tempon', mqtt.GROUP_TOPICS),
+        ('fan_status_tempoff', mqtt.GROUP_TOPICS),
+        ('fan_command_percon', None),
+        ('fan_command_percoff', None),
+        ('fan_command_tempon', None),
+        ('fan_command_tempoff', None),
+    ]:
+        topic_name(cfg_option, cfg_section)
+    fan_topics.clear()
+    fan_topics.update({
+        topic_name('mqtt_topic_fan_command', mqtt.GROUP_DEFAULT):
+            fan_topic_command,
+        topic_name('fan_command_percon'): fan_topic_percon,
+        topic_name('fan_command_percoff'): fan_topic_percoff,
+        topic_name('fan_command_tempon'): fan_topic_tempon,
+        topic_name('fan_command_tempoff'): fan_topic_tempoff,
+    })
 
 
 def setup_mqtt_filters():
@@ -639,33 +1058,25 @@ def setup_mqtt_filters():
     )
     try:
         mqtt.subscribe_filters()
-    except Exception as errcode:
+    except (OSError, ValueError) as errcode:
         logger.error(
             'MQTT subscribtion to topic filters failed with error code %s',
             errcode)
 
 
 def setup_timers():
-    """Define dictionary of timers."""
+    """Define the timer for all periodic actions."""
     cfg_section = 'Timers'
-    # Timer1
-    name = 'Timer_mqtt'
-    c_period = float(config.option('period_mqtt', cfg_section, 15.0))
-    c_period = max(min(c_period, 180.0), 5.0)
-    logger.debug('Setup timer %s: period = %ss', name, c_period)
-    modTimer.Timer(
-        c_period,
-        cbTimer_mqtt_reconnect,
-        name=name,
-    )
-    # Timer2
+    period_fan = clamp(
+        config_float('period_fan', cfg_section, 5.0), 1.0, 60.0)
+    Script.tick_cpu = config_int('cpu_affinity', cfg_section)
+    if Script.tick_cpu is not None and Script.tick_cpu < 0:
+        Script.tick_cpu = None
     name = 'Timer_fan'
-    c_period = float(config.option('period_fan', cfg_section, 5.0))
-    c_period = max(min(c_period, 60.0), 1.0)
-    logger.debug('Setup timer %s: period = %ss', name, c_period)
+    logger.debug('Setup timer %s: period = %ss', name, period_fan)
     modTimer.Timer(
-        c_period,
-        cbTimer_fan,
+        period_fan,
+        cbTimer_tick,
         name=name,
     )
     # Start all timers
@@ -678,25 +1089,31 @@ def setup():
     if cmdline.configuration:
         print(config.content)
     # Running mode
-    msg = \
-        f'Script runs as a ' \
-        f'{"service" if Script.service else "program"}'
-    logger.info(msg)
+    logger.info(
+        'Script runs as a %s', 'service' if Script.service else 'program')
     # Initially switch off the fan
-    pi.pin_off(dev_fan.pin)
+    fan_switch(False)
+    # Finish the script loop at terminating
+    signal.signal(signal.SIGTERM, cbSignal_stop)
+    signal.signal(signal.SIGINT, cbSignal_stop)
+    # Reload configuration on demand
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, cbSignal_reload)
 
 
 def loop():
     """Wait for keyboard or system exit."""
     try:
         logger.info('Script loop started')
-        while (Script.running):
-            time.sleep(0.01)
+        Script.stop_event.wait()
         logger.warning('Script finished')
     except (KeyboardInterrupt, SystemExit):
         logger.warning('Script cancelled from keyboard')
     finally:
-        action_exit()
+        try:
+            action_exit()
+        finally:
+            log_listener.stop()
 
 
 def main():
@@ -704,12 +1121,21 @@ def main():
     setup_params()
     setup_cmdline()
     setup_logger()
-    setup_config()
-    setup_pi()
-    setup_fan()
-    setup_mqtt()
-    setup_timers()
-    setup()
+    try:
+        setup_config()
+        setup_pi()
+        setup_fan()
+        setup_mqtt()
+        setup_timers()
+        setup()
+        # Root is needed for the log file, GPIO pin, and thermal file
+        setup_privileges()
+    except OSError as errmsg:
+        logger.critical('Script setup failed: %s', errmsg)
+        action_abort()
+    except Exception:
+        logger.exception('Script setup failed with unexpected error')
+        action_abort()
     loop()
 
 